@@ -28,7 +28,7 @@ def main():
         execution_time = (datetime.now() - start_time).total_seconds()
         etl.email_util.send_email(
             "ETL Process Successful",
-            f"The ETL process completed successfully in {execution_time} seconds."
+            f"The ETL process completed successfully in {execution_time} seconds.\n{etl.run_report_summary()}"
         )
         logging.info("ETL process completed successfully.")
 
@@ -38,6 +38,8 @@ def main():
             "ETL Process Failed",
             f"ETL process failed with error: {e}"
         )
+    finally:
+        etl.close()
 
 if __name__ == "__main__":
     main()
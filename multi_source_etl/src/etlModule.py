@@ -3,6 +3,12 @@
 
 import configparser
 import logging
+import logging.handlers
+import queue
+import threading
+import time
+import atexit
+import copy
 import requests
 import os
 import glob
@@ -19,31 +25,668 @@ import pandas as pd
 import boto3
 import paramiko
 import json
+import hashlib
+import re
+import math
+import mmap
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine
 import numpy as np
 
+class JsonLogFormatter(logging.Formatter):
+    def __init__(self, job_name):
+        super().__init__()
+        self.job_name = job_name
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'job': self.job_name,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry)
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() folds the traceback into the message; keep it in exc_text
+    # so the JSON file gets a separate exception field.
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
 class EmailUtility:
-    def __init__(self, email_config):
+    # Messages are queued and delivered by a background thread that keeps one
+    # SMTP connection open and sends everything queued within batch_window on it.
+    def __init__(self, email_config, batch_window=2.0, idle_timeout=60.0):
         ssm = boto3.client('ssm', region_name='us-west-2')
         self.smtp_password = ssm.get_parameter(Name='smtp_password', WithDecryption=True)['Parameter']['Value']
         self.server = email_config['smtp_server']
         self.port = email_config['smtp_port']
         self.user = email_config.get('user')
         self.recipient = email_config['recipient']
+        # Only for a local debug server: without STARTTLS no credentials are sent.
+        self.use_starttls = email_config.getboolean('smtp_starttls', fallback=True)
+        self.batch_window = batch_window
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue()
+        self._connection = None
+        self._worker = threading.Thread(target=self._run, name='email-sender', daemon=True)
+        self._worker.start()
 
     def send_email(self, subject, body):
-        msg = MIMEMultipart()
-        msg['From'] = self.user if self.user else 'anonymous@example.com'
-        msg['To'] = self.recipient
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-        server = smtplib.SMTP(self.server, self.port)
-        server.starttls()
-        if self.user and self.smtp_password:
-            server.login(self.user, self.smtp_password)
-        server.sendmail(self.user if self.user else 'anonymous@example.com', self.recipient, msg.as_string())
-        server.quit()
-        logging.info("Email sent successfully")
+        self._queue.put((subject, body))
+
+    def close(self, timeout=None):
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            batch = []
+            deadline = time.monotonic() + self.batch_window
+            while item is not None:
+                batch.append(item)
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            stopping = item is None
+            if batch:
+                self._deliver(batch)
+        self._disconnect()
+
+    def _deliver(self, batch):
+        sender = self.user if self.user else 'anonymous@example.com'
+        for position, (subject, body) in enumerate(batch):
+            msg = MIMEMultipart()
+            msg['From'] = sender
+            msg['To'] = self.recipient
+            msg['Subject'] = subject
+            msg.attach(MIMEText(body, 'plain'))
+            try:
+                self._connect().sendmail(sender, self.recipient, msg.as_string())
+            except (smtplib.SMTPException, OSError):
+                # The connection may have dropped since the last message; reconnect once.
+                self._disconnect()
+                try:
+                    self._connect().sendmail(sender, self.recipient, msg.as_string())
+                except (smtplib.SMTPException, OSError) as e:
+                    logging.error(f"Failed to send email: {e}")
+                    self._disconnect()
+                    for undelivered_subject, _ in batch[position:]:
+                        logging.error(f"Email not delivered: {undelivered_subject}")
+                    return
+            logging.info("Email sent successfully")
+
+    def _connect(self):
+        if self._connection is not None:
+            try:
+                self._connection.noop()
+                return self._connection
+            except (smtplib.SMTPException, OSError):
+                self._disconnect()
+        server = smtplib.SMTP(self.server, self.port, timeout=30)
+        server.ehlo()
+        if self.use_starttls:
+            server.starttls()
+            server.ehlo()
+            if self.user and self.smtp_password:
+                server.login(self.user, self.smtp_password)
+        elif self.user and self.smtp_password:
+            logging.warning("smtp_starttls is off; sending without logging in")
+        self._connection = server
+        return server
+
+    def _disconnect(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._connection = None
+
+class CheckpointStore:
+    # Each entry lists the RecId ranges a file's rows were loaded into. The number of
+    # rows committed is read back from the table, so progress is never written per batch.
+    def __init__(self, checkpoint_path):
+        os.makedirs(checkpoint_path, exist_ok=True)
+        self.store_file = os.path.join(checkpoint_path, 'etl_checkpoints.json')
+        self.checkpoints = {}
+        if os.path.exists(self.store_file):
+            with open(self.store_file, 'r') as f:
+                self.checkpoints = json.load(f)
+
+    def file_identity(self, file_path):
+        # Name, size and a hash of the first 64KB survive the file being re-downloaded or moved.
+        with open(file_path, 'rb') as f:
+            head_digest = hashlib.sha1(f.read(65536)).hexdigest()
+        file_size = os.path.getsize(file_path)
+        return f"{os.path.basename(file_path)}:{file_size}:{head_digest}"
+
+    def _key(self, file_path, table_name):
+        return f"{table_name}|{self.file_identity(file_path)}"
+
+    def load_name(self, file_path, table_name):
+        # Stable across runs and safe as a file name, for state kept beside the checkpoint.
+        return hashlib.sha1(self._key(file_path, table_name).encode('utf-8')).hexdigest()
+
+    def get(self, file_path, table_name):
+        checkpoint = self.checkpoints.get(self._key(file_path, table_name))
+        return json.loads(json.dumps(checkpoint)) if checkpoint else None
+
+    def begin(self, file_path, table_name, max_rec_id):
+        # Rows loaded from now on get RecIds above max_rec_id, so every other open range
+        # of this table ends here.
+        for checkpoint in self.checkpoints.values():
+            if checkpoint['table'] == table_name and checkpoint['ranges'] and checkpoint['ranges'][-1][1] is None:
+                checkpoint['ranges'][-1][1] = max_rec_id
+        checkpoint = self.checkpoints.setdefault(self._key(file_path, table_name), {
+            'file': file_path,
+            'table': table_name,
+            'ranges': [],
+            'completed': False,
+        })
+        checkpoint['ranges'].append([max_rec_id, None])
+        checkpoint['updated'] = datetime.now().isoformat()
+        self._save()
+        return [list(rec_id_range) for rec_id_range in checkpoint['ranges']]
+
+    def complete(self, file_path, table_name):
+        checkpoint = self.checkpoints.get(self._key(file_path, table_name))
+        if checkpoint:
+            checkpoint['completed'] = True
+            checkpoint['updated'] = datetime.now().isoformat()
+            self._save()
+
+    def is_completed(self, file_path, table_name):
+        checkpoint = self.checkpoints.get(self._key(file_path, table_name))
+        return bool(checkpoint and checkpoint['completed'])
+
+    def has_incomplete(self, table_name):
+        return bool(self.incomplete(table_name))
+
+    def incomplete(self, table_name):
+        return {key: checkpoint for key, checkpoint in self.checkpoints.items()
+                if checkpoint['table'] == table_name and not checkpoint['completed']}
+
+    def in_input(self, key):
+        # The interrupted file is still where it was read from, unchanged.
+        checkpoint = self.checkpoints[key]
+        return os.path.isfile(checkpoint['file']) and self._key(checkpoint['file'], checkpoint['table']) == key
+
+    def remove(self, key):
+        if self.checkpoints.pop(key, None):
+            self._save()
+
+    def clear_table(self, table_name):
+        keys = [key for key, checkpoint in self.checkpoints.items() if checkpoint['table'] == table_name]
+        for key in keys:
+            del self.checkpoints[key]
+        if keys:
+            self._save()
+
+    def _save(self):
+        tmp_file = self.store_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.checkpoints, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.store_file)
+
+class RowDeduplicator:
+    # Row hashes are 128-bit, stored as sorted 16-byte runs split into buckets by first
+    # byte. New rows are staged until the load that used them commits, so a failed or
+    # resumed load never treats its own rows as duplicates. Each load keeps its filtered
+    # output and the keys of its kept rows until it completes: a resumed load re-reads
+    # them, so the rows it already committed are the same rows this time.
+    NUM_BUCKETS = 256
+    CHUNK_ROWS = 100000
+    KEY_DTYPE = np.dtype('S16')
+
+    def __init__(self, dedup_path, expected_rows=100000000, false_positive_rate=0.01, spill_rows=2000000):
+        self.dedup_path = dedup_path
+        self.filtered_path = os.path.join(dedup_path, 'filtered')
+        os.makedirs(self.filtered_path, exist_ok=True)
+        meta_file = os.path.join(dedup_path, 'bloom.json')
+        bloom_file = os.path.join(dedup_path, 'bloom.bin')
+        if os.path.exists(meta_file) and os.path.exists(bloom_file):
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+            self.num_bits = meta['num_bits']
+            self.num_hashes = meta['num_hashes']
+            mode = 'r+'
+        else:
+            num_bits = int(-expected_rows * math.log(false_positive_rate) / (math.log(2) ** 2))
+            self.num_bits = max(8, num_bits - num_bits % 8)
+            self.num_hashes = max(1, round(self.num_bits / expected_rows * math.log(2)))
+            with open(meta_file, 'w') as f:
+                json.dump({'num_bits': self.num_bits, 'num_hashes': self.num_hashes}, f)
+            mode = 'w+'
+        self.bloom = np.memmap(bloom_file, dtype=np.uint8, mode=mode, shape=(self.num_bits // 8,))
+        self.spill_rows = spill_rows
+        self.staged = set()
+        self.staged_spills = []
+        self._spill_maps = []
+        self._run_maps = {}
+        self.runs = {bucket: [] for bucket in range(self.NUM_BUCKETS)}
+        for run_file in sorted(glob.glob(os.path.join(dedup_path, 'keys_*_*.bin'))):
+            self.runs[int(os.path.basename(run_file).split('_')[1], 16)].append(run_file)
+        self._next_run = 1 + max((int(os.path.splitext(run_file)[0].rsplit('_', 1)[1])
+                                  for bucket_runs in self.runs.values() for run_file in bucket_runs), default=0)
+        self.duplicates_dropped = 0
+        for leftover in glob.glob(os.path.join(dedup_path, 'staged_*.bin')):
+            os.remove(leftover)
+
+    @staticmethod
+    def hash_key(fields):
+        return hashlib.blake2b('\x1f'.join(fields).encode('utf-8'), digest_size=16).digest()
+
+    def _load_file(self, load_name, extension):
+        return os.path.join(self.filtered_path, load_name + extension)
+
+    def filter_csv(self, file_path, delimiter, has_header, key_columns, load_name, rows_committed=0):
+        # On resume the first rows_committed records of the earlier output are already in
+        # the table: they are kept as they were and stored, and only the rest is filtered.
+        output_path = self._load_file(load_name, '.csv')
+        keys_file = self._load_file(load_name, '.keys')
+        source_path = output_path if rows_committed and os.path.exists(output_path) else file_path
+        duplicates = 0
+        with open(source_path, 'r', newline='') as infile, \
+                open(output_path + '.tmp', 'w', newline='') as outfile, \
+                open(keys_file + '.tmp', 'wb') as keys_out:
+            # Keep the raw text of each record so kept rows are written byte-for-byte.
+            raw_lines = []
+            def tee_lines():
+                for line in infile:
+                    raw_lines.append(line)
+                    yield line
+            reader = csv.reader(tee_lines(), delimiter=delimiter)
+            key_indexes = None
+            if has_header:
+                header = next(reader, None)
+                outfile.write(''.join(raw_lines))
+                raw_lines.clear()
+                if header is not None and key_columns:
+                    key_indexes = [header.index(column) for column in key_columns]
+            elif key_columns:
+                raise ValueError("dedup_key_columns requires file_has_header = True")
+            committed, committed_hashes = 0, []
+            records, hashes = [], []
+            for row in reader:
+                record = ''.join(raw_lines)
+                raw_lines.clear()
+                if not row:
+                    continue
+                key = row if key_indexes is None else [row[i] if i < len(row) else '' for i in key_indexes]
+                if committed < rows_committed:
+                    outfile.write(record)
+                    committed_hashes.append(self.hash_key(key))
+                    committed += 1
+                    if committed == rows_committed:
+                        keys_out.write(self._store_committed(committed_hashes).tobytes())
+                        committed_hashes = []
+                    continue
+                records.append(record)
+                hashes.append(self.hash_key(key))
+                if len(records) >= self.CHUNK_ROWS:
+                    duplicates += self._write_new(records, hashes, outfile, keys_out)
+                    records, hashes = [], []
+            if committed_hashes:
+                keys_out.write(self._store_committed(committed_hashes).tobytes())
+            if records:
+                duplicates += self._write_new(records, hashes, outfile, keys_out)
+        os.replace(output_path + '.tmp', output_path)
+        os.replace(keys_file + '.tmp', keys_file)
+        self.duplicates_dropped += duplicates
+        logging.info(f"Dropped {duplicates} duplicate rows from {file_path}")
+        return output_path, duplicates
+
+    def filter_records(self, records, key_columns, load_name, rows_committed=0):
+        # Same as filter_csv, with the kept record positions saved instead of a file.
+        index_file = self._load_file(load_name, '.npy')
+        if rows_committed and os.path.exists(index_file):
+            candidates = np.load(index_file)
+        else:
+            candidates = np.arange(len(records))
+        hashes = []
+        for position in candidates.tolist():
+            item = records[position]
+            if key_columns:
+                hashes.append(self.hash_key([str(item.get(column)) for column in key_columns]))
+            else:
+                hashes.append(self.hash_key([json.dumps(item, sort_keys=True)]))
+        hashes = self._key_array(hashes)
+        committed = self._store_committed(hashes[:rows_committed])
+        keep = self._keep_new(hashes[len(committed):])
+        kept = np.concatenate((candidates[:len(committed)], candidates[len(committed):][keep]))
+        np.save(index_file, kept)
+        np.concatenate((committed, hashes[len(committed):][keep])).tofile(self._load_file(load_name, '.keys'))
+        duplicates = len(candidates) - len(kept)
+        self.duplicates_dropped += duplicates
+        logging.info(f"Dropped {duplicates} duplicate records")
+        return [records[position] for position in kept.tolist()], duplicates
+
+    def store_loaded(self, load_name, rows):
+        # A failed load's committed rows are in the table, so later files must see them.
+        keys_file = self._load_file(load_name, '.keys')
+        if rows and os.path.exists(keys_file):
+            count = min(rows, os.path.getsize(keys_file) // self.KEY_DTYPE.itemsize)
+            self._store_committed(np.fromfile(keys_file, dtype=self.KEY_DTYPE, count=count))
+
+    def release(self, load_name):
+        for extension in ('.csv', '.keys', '.npy'):
+            load_file = self._load_file(load_name, extension)
+            if os.path.exists(load_file):
+                os.remove(load_file)
+
+    def _key_array(self, hashes):
+        return np.frombuffer(b''.join(hashes), dtype=self.KEY_DTYPE)
+
+    def _write_new(self, records, hashes, outfile, keys_out):
+        hashes = self._key_array(hashes)
+        keep = self._keep_new(hashes)
+        outfile.write(''.join(record for record, kept in zip(records, keep) if kept))
+        keys_out.write(hashes[keep].tobytes())
+        return len(records) - int(keep.sum())
+
+    def _keep_new(self, hashes):
+        keep = np.zeros(len(hashes), dtype=bool)
+        _, first_seen = np.unique(hashes, return_index=True)
+        keep[first_seen] = True
+        candidates = np.nonzero(keep & self._bloom_contains(hashes))[0]
+        if len(candidates):
+            keep[candidates[self._seen(hashes[candidates])]] = False
+        new_hashes = hashes[keep]
+        self._bloom_add(new_hashes)
+        self._stage(new_hashes)
+        return keep
+
+    def _store_committed(self, hashes):
+        # Written straight to the runs, bypassing the staged set: these rows are in the
+        # table whether or not the current load succeeds. Returns the keys in file order.
+        if not isinstance(hashes, np.ndarray):
+            hashes = self._key_array(hashes)
+        new_keys = np.unique(hashes)
+        if len(new_keys):
+            known = self._bloom_contains(new_keys)
+            if known.any():
+                known[known] = self._seen(new_keys[known])
+                new_keys = new_keys[~known]
+            self._bloom_add(new_keys)
+            bounds = self._bucket_bounds(new_keys)
+            for bucket in range(self.NUM_BUCKETS):
+                if bounds[bucket + 1] > bounds[bucket]:
+                    self._append_run(bucket, new_keys[bounds[bucket]:bounds[bucket + 1]])
+            self.bloom.flush()
+        return hashes
+
+    def _bloom_positions(self, hashes):
+        halves = hashes.view('>u8').reshape(-1, 2).astype(np.uint64)
+        h1 = halves[:, 0]
+        h2 = halves[:, 1] | np.uint64(1)
+        for i in range(self.num_hashes):
+            yield (h1 + np.uint64(i) * h2) % np.uint64(self.num_bits)
+
+    def _bloom_contains(self, hashes):
+        found = np.ones(len(hashes), dtype=bool)
+        for positions in self._bloom_positions(hashes):
+            masks = np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+            found &= (self.bloom[positions >> np.uint64(3)] & masks) != 0
+        return found
+
+    def _bloom_add(self, hashes):
+        for positions in self._bloom_positions(hashes):
+            masks = np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+            np.bitwise_or.at(self.bloom, positions >> np.uint64(3), masks)
+
+    @staticmethod
+    def _in_sorted(sorted_keys, hashes):
+        if len(sorted_keys) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+        idx = np.minimum(np.searchsorted(sorted_keys, hashes), len(sorted_keys) - 1)
+        return sorted_keys[idx] == hashes
+
+    @staticmethod
+    def _bucket_of(hashes):
+        return hashes.view(np.uint8).reshape(-1, 16)[:, 0]
+
+    def _bucket_bounds(self, sorted_keys):
+        # Offsets where each bucket starts in a sorted run, plus the run length.
+        if len(sorted_keys) == 0:
+            return [0] * (self.NUM_BUCKETS + 1)
+        first_bytes = self._bucket_of(sorted_keys)
+        return np.searchsorted(first_bytes, np.arange(self.NUM_BUCKETS + 1)).tolist()
+
+    def _run_map(self, run_file):
+        if run_file not in self._run_maps:
+            self._run_maps[run_file] = np.memmap(run_file, dtype=self.KEY_DTYPE, mode='r')
+        return self._run_maps[run_file]
+
+    def _seen(self, hashes):
+        seen = np.fromiter((h in self.staged for h in hashes.tolist()), dtype=bool, count=len(hashes))
+        for spill in self._spill_maps:
+            seen |= self._in_sorted(spill, hashes)
+        buckets = self._bucket_of(hashes)
+        for bucket in np.unique(buckets):
+            selected = buckets == bucket
+            for run_file in self.runs[int(bucket)]:
+                seen[selected] |= self._in_sorted(self._run_map(run_file), hashes[selected])
+        return seen
+
+    def _stage(self, hashes):
+        self.staged.update(hashes.tolist())
+        if len(self.staged) >= self.spill_rows:
+            spill_file = os.path.join(self.dedup_path, f'staged_{len(self.staged_spills)}.bin')
+            spill = self._sorted_staged()
+            spill.tofile(spill_file)
+            self.staged_spills.append((spill_file, self._bucket_bounds(spill)))
+            self._spill_maps.append(np.memmap(spill_file, dtype=self.KEY_DTYPE, mode='r'))
+            self.staged.clear()
+
+    def _sorted_staged(self):
+        return np.sort(np.array(list(self.staged), dtype=self.KEY_DTYPE))
+
+    def commit(self):
+        # Mapped files cannot be deleted on Windows, so drop the spill maps and read
+        # each spill back per bucket with plain file reads.
+        self._spill_maps = []
+        staged = self._sorted_staged()
+        staged_bounds = self._bucket_bounds(staged)
+        for bucket in range(self.NUM_BUCKETS):
+            parts = [staged[staged_bounds[bucket]:staged_bounds[bucket + 1]]]
+            for spill_file, bounds in self.staged_spills:
+                count = bounds[bucket + 1] - bounds[bucket]
+                if count:
+                    parts.append(np.fromfile(spill_file, dtype=self.KEY_DTYPE, count=count,
+                                             offset=bounds[bucket] * self.KEY_DTYPE.itemsize))
+            new_keys = np.unique(np.concatenate(parts))
+            if len(new_keys):
+                self._append_run(bucket, new_keys)
+        self.bloom.flush()
+        self.discard()
+
+    def _append_run(self, bucket, keys):
+        self.runs[bucket].append(self._write_run(bucket, keys))
+        # Size-tiered compaction: merge while the newest run is at least half the size
+        # of the one before it, so each key is rewritten O(log n) times overall.
+        bucket_runs = self.runs[bucket]
+        while len(bucket_runs) > 1 and os.path.getsize(bucket_runs[-2]) <= 2 * os.path.getsize(bucket_runs[-1]):
+            older, newer = bucket_runs[-2], bucket_runs[-1]
+            for run_file in (older, newer):
+                self._run_maps.pop(run_file, None)
+            merged = np.union1d(np.fromfile(older, dtype=self.KEY_DTYPE), np.fromfile(newer, dtype=self.KEY_DTYPE))
+            bucket_runs[-2:] = [self._write_run(bucket, merged)]
+            os.remove(older)
+            os.remove(newer)
+
+    def _write_run(self, bucket, keys):
+        run_file = os.path.join(self.dedup_path, f'keys_{bucket:02x}_{self._next_run:08d}.bin')
+        self._next_run += 1
+        tmp_file = run_file + '.tmp'
+        keys.tofile(tmp_file)
+        os.replace(tmp_file, run_file)
+        return run_file
+
+    def discard(self):
+        self._spill_maps = []
+        spill_files = [spill_file for spill_file, _ in self.staged_spills]
+        self.staged_spills = []
+        self.staged.clear()
+        for spill_file in spill_files:
+            os.remove(spill_file)
+
+    def close(self):
+        self.discard()
+        self._run_maps = {}
+        self.bloom.flush()
+        self.bloom = None
+
+class DelimitedFileScanner:
+    # Per-column metrics are the ones SQL Server can recompute exactly on the loaded
+    # table: non-null count, COUNT; total bytes, DATALENGTH; first byte, ASCII.
+    # Empty fields are skipped because bcp loads them as NULL. A code page conversion
+    # only leaves ASCII untouched, so non_ascii_counts tells which columns the byte
+    # sums can be compared for.
+    BLOCK_SIZE = 16 * 1024 * 1024
+    METRICS = ('value_counts', 'non_ascii_counts', 'length_sums', 'first_char_sums')
+    TERMINATOR, QUOTE, NON_ASCII = 1, 2, 3
+
+    def __init__(self, delimiter, skip_rows=0, strip_cr=True, quote_char='"'):
+        if len(delimiter.encode('utf-8')) != 1:
+            raise ValueError(f"Reconciliation needs a single-byte field delimiter, got {delimiter!r}")
+        self.delimiter = ord(delimiter)
+        self.skip_rows = skip_rows
+        self.strip_cr = strip_cr
+        self.quote_char = ord(quote_char)
+        # One lookup per block finds every byte of interest; the rest of the work is on those.
+        self.byte_classes = np.zeros(256, dtype=np.uint8)
+        self.byte_classes[128:] = self.NON_ASCII
+        self.byte_classes[self.quote_char] = self.QUOTE
+        self.byte_classes[[self.delimiter, 10]] = self.TERMINATOR
+
+    def scan(self, file_path, cancel=None):
+        if os.path.getsize(file_path) == 0:
+            return {'rows': 0, **{metric: [] for metric in self.METRICS}}
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = self._skip_records(mm, self.skip_rows)
+            # Every numpy view of the map must be gone before it closes, so scan in a helper.
+            result = self._scan_buffer(np.frombuffer(mm, dtype=np.uint8), start, cancel)
+        if result is None:
+            raise RuntimeError("Source scan cancelled")
+        return result
+
+    def _skip_records(self, mm, count):
+        position = 0
+        quoted = False
+        while count > 0 and position < len(mm):
+            byte = mm[position]
+            position += 1
+            if byte == self.quote_char:
+                quoted = not quoted
+            elif byte == 10 and not quoted:
+                count -= 1
+        return position
+
+    def _scan_buffer(self, data, start, cancel=None):
+        size = len(data)
+        rows = 0
+        totals = {metric: np.zeros(0, dtype=np.int64) for metric in self.METRICS}
+        field_start = start
+        column = 0
+        in_quotes = 0
+        open_field_non_ascii = False
+        for block_start in range(start, size, self.BLOCK_SIZE):
+            if cancel is not None and cancel.is_set():
+                return None
+            block = data[block_start:block_start + self.BLOCK_SIZE]
+            classes = self.byte_classes[block]
+            positions = np.flatnonzero(classes)
+            classes = classes[positions]
+            ends = positions[classes == self.TERMINATOR]
+            quotes = positions[classes == self.QUOTE]
+            marked = positions[classes == self.NON_ASCII]
+            if len(quotes) or in_quotes:
+                # A terminator is quoted when an odd number of quotes precede it.
+                ends = ends[(np.searchsorted(quotes, ends) + in_quotes) % 2 == 0]
+                in_quotes = (in_quotes + len(quotes)) % 2
+            if len(ends) == 0:
+                open_field_non_ascii = open_field_non_ascii or len(marked) > 0
+                continue
+            non_ascii = np.zeros(len(ends), dtype=bool)
+            non_ascii[0] = open_field_non_ascii
+            marked_fields = np.searchsorted(ends, marked)
+            open_field_non_ascii = len(marked_fields) > 0 and marked_fields[-1] == len(ends)
+            non_ascii[marked_fields[marked_fields < len(ends)]] = True
+            row_end = block[ends] == 10
+            ends += block_start
+            starts = np.empty_like(ends)
+            starts[0] = field_start
+            np.add(ends[:-1], 1, out=starts[1:])
+            field_start = int(ends[-1]) + 1
+            first_chars = data[starts]
+            lengths = np.subtract(ends, starts, out=starts)
+            if self.strip_cr:
+                carriage = data[ends - 1] == 13
+                carriage &= row_end
+                carriage &= lengths > 0
+                lengths -= carriage
+            # Column of each field: its offset from the first field of its row.
+            row_ends = np.flatnonzero(row_end)
+            columns = np.zeros(len(ends), dtype=np.int64)
+            next_rows = row_ends[:-1] + 1 if row_end[-1] else row_ends + 1
+            columns[next_rows] = next_rows
+            np.maximum.accumulate(columns, out=columns)
+            np.subtract(np.arange(len(ends)), columns, out=columns)
+            columns[:next_rows[0] if len(next_rows) else len(ends)] += column
+            column = 0 if row_end[-1] else int(columns[-1]) + 1
+            blank_rows = int(np.count_nonzero((columns[row_ends] == 0) & (lengths[row_ends] == 0)))
+            rows += len(row_ends) - blank_rows
+            self._accumulate(totals, columns, lengths, first_chars, non_ascii)
+        if field_start < size or column > 0:
+            # Last record has no trailing newline.
+            lengths = np.array([size - field_start], dtype=np.int64)
+            if self.strip_cr and lengths[0] > 0 and data[size - 1] == 13:
+                lengths -= 1
+            self._accumulate(totals, np.array([column]), lengths, data[[min(field_start, size - 1)]],
+                             np.array([open_field_non_ascii]))
+            if column > 0 or lengths[0] > 0:
+                rows += 1
+        return {'rows': rows, **{metric: totals[metric].tolist() for metric in self.METRICS}}
+
+    @staticmethod
+    def _accumulate(totals, columns, lengths, first_chars, non_ascii):
+        present = lengths > 0
+        if not present.any():
+            return
+        width = max(len(totals['value_counts']), int(columns[present].max()) + 1)
+        def grow(metric, selected, weights=None):
+            counts = np.bincount(columns[selected], weights=None if weights is None else weights[selected],
+                                 minlength=width).astype(np.int64)
+            counts[:len(totals[metric])] += totals[metric]
+            totals[metric] = counts
+        grow('value_counts', present)
+        grow('non_ascii_counts', present & non_ascii)
+        grow('length_sums', present, lengths)
+        grow('first_char_sums', present, first_chars)
 
 class ETLProcess:
     def __init__(self, config_file):
@@ -51,8 +694,12 @@ class ETLProcess:
         self.pwd = ssm.get_parameter(Name='sql_password', WithDecryption=True)['Parameter']['Value']
         self.config = configparser.ConfigParser()
         self.config.read(config_file)
-        self.setup_logging()
+        self.closed = False
+        self.log_listener = None
+        self.log_queue_handler = None
+        self.setup_logging(config_file)
         self.email_util = EmailUtility(self.config['EMAIL'])
+        atexit.register(self.close)
         self.db_type = self.config['ETL']['database_type']
         self.dbServer = self.config['MSSQL']['server']
         self.dbName = self.config['MSSQL']['database']
@@ -71,6 +718,14 @@ class ETLProcess:
         self.file_type = self.config['ETL']['file_type']
         self.file_has_header = self.config['ETL'].getboolean('file_has_header')
         self.archive_path = self.config['ETL']['archive_path']
+        self.checkpoints = CheckpointStore(self.config['ETL'].get('checkpoint_path', self.config['ETL']['log_path']))
+        self.checkpoint_max_attempts = self.config['ETL'].getint('checkpoint_max_attempts', fallback=3)
+        self.dedup_key_columns = [column.strip() for column in self.config['ETL'].get('dedup_key_columns', '').split(',') if column.strip()]
+        self.dedup_rows = self.config['ETL'].getboolean('dedup_rows', fallback=False)
+        self.reconcile_load = self.config['ETL'].getboolean('reconcile_load', fallback=True)
+        self.run_report = []
+        self.deduplicators = {}
+        self.started_tables = set()
         bcp_end_of_row = self.config['ETL']['bcp_end_of_row']
         if bcp_end_of_row == r'\n':
             self.bcp_end_of_row = '"\\n"'
@@ -90,9 +745,9 @@ class ETLProcess:
             for filename in glob.glob(full_pattern):
                 try:
                     os.remove(filename)
-                    print(f"Removed {filename}")
+                    logging.info(f"Removed {filename}")
                 except OSError as e:
-                    print(f"Error: {e.strerror}")
+                    logging.error(f"Error: {e.strerror}")
         for filename in os.listdir(folder_path):
             file_path = os.path.join(folder_path, filename)
             try:
@@ -101,14 +756,67 @@ class ETLProcess:
                 elif os.path.isdir(file_path):
                     shutil.rmtree(file_path)
             except Exception as e:
-                print(f'Failed to delete {file_path}. Reason: {e}')
+                logging.error(f'Failed to delete {file_path}. Reason: {e}')
 
-    def setup_logging(self):
-        logging.basicConfig(
-            filename='etl_log.log',
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+    def setup_logging(self, config_file):
+        job_name = self.config['ETL'].get('job_name', os.path.splitext(os.path.basename(config_file))[0])
+        log_path = self.config['ETL'].get('log_path', '.')
+        os.makedirs(log_path, exist_ok=True)
+        self.job_name = job_name
+        self.log_stem = os.path.join(log_path, f"{job_name}_{datetime.now():%Y%m%d_%H%M%S}")
+        log_file = self.log_stem + '.log'
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setFormatter(JsonLogFormatter(job_name))
+        # Callers only enqueue records; file and console I/O happen on the listener thread.
+        root = logging.getLogger()
+        handlers = [file_handler] + [h for h in root.handlers if not isinstance(h, logging.handlers.QueueHandler)]
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        log_queue = queue.Queue(-1)
+        self.log_queue_handler = StructuredQueueHandler(log_queue)
+        root.addHandler(self.log_queue_handler)
+        root.setLevel(logging.INFO)
+        self.log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.log_listener.start()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.run_report:
+            self.write_run_report()
+        self.email_util.close()
+        if self.log_listener:
+            self.log_listener.stop()
+            # Hand the real handlers back to root so records logged after close are not lost.
+            root = logging.getLogger()
+            root.removeHandler(self.log_queue_handler)
+            for handler in self.log_listener.handlers:
+                root.addHandler(handler)
+            self.log_listener = None
+
+    def get_deduplicator(self, table_name):
+        if not self.dedup_rows:
+            return None
+        if table_name not in self.deduplicators:
+            dedup_path = self.config['ETL'].get('dedup_path', os.path.join(self.config['ETL']['log_path'], 'dedup'))
+            self.deduplicators[table_name] = RowDeduplicator(
+                os.path.join(dedup_path, table_name),
+                expected_rows=self.config['ETL'].getint('dedup_expected_rows', fallback=100000000),
+                false_positive_rate=self.config['ETL'].getfloat('dedup_false_positive_rate', fallback=0.01),
+            )
+        return self.deduplicators[table_name]
+
+    def reset_deduplicator(self, table_name):
+        # The hash store describes what the table holds, so it goes when the table is dropped.
+        deduplicator = self.deduplicators.pop(table_name, None)
+        if deduplicator:
+            deduplicator.close()
+        dedup_path = self.config['ETL'].get('dedup_path', os.path.join(self.config['ETL']['log_path'], 'dedup'))
+        table_dedup_path = os.path.join(dedup_path, table_name)
+        if os.path.isdir(table_dedup_path):
+            shutil.rmtree(table_dedup_path)
+            logging.info(f"Cleared the dedup store for {table_name}")
 
     def download_from_url(self, url, target_file):
         try:
@@ -139,7 +847,7 @@ class ETLProcess:
                 if file_extension in self.file_extensions:
                     destination_path = os.path.join(destination_folder, file_name)
                     s3.download_file(s3_bucket, s3_folder+file_name, destination_path)
-                    print(f"Copied s3://{s3_bucket}{s3_folder}{file_name} to {destination_path}")
+                    logging.info(f"Copied s3://{s3_bucket}{s3_folder}{file_name} to {destination_path}")
 
     def download_from_sftp(self, host, port, username, password, remote_path, local_path):
         ssh = paramiko.SSHClient()
@@ -176,24 +884,40 @@ class ETLProcess:
             dest_file_path = os.path.join(self.archive_path, os.path.basename(file_path))
             if os.path.exists(dest_file_path):
                 os.remove(dest_file_path)
-            print(f"Moving {file_path} to the archive folder {self.archive_path} ...")
+            logging.info(f"Moving {file_path} to the archive folder {self.archive_path} ...")
             shutil.move(file_path, self.archive_path)
 
-    def bcp_import(self, file_path, tableName):
+    def bcp_import(self, file_path, tableName, rows_committed=0):
         delimiter = self.field_delimiter
         if delimiter == '\t':
             delimiter = '"\\t"'
-        bcp_command = f"bcp {self.dbName}.dbo.{tableName}_View IN {file_path} -F {self.bcp_row_start} -c -b {self.bcp_batch_commit_size} -t{delimiter} -S {self.dbServer} -r {self.bcp_end_of_row} "
+        first_row = int(self.bcp_row_start) + rows_committed
+        if rows_committed:
+            logging.info(f"Resuming BCP import of {file_path} at row {first_row}")
+        bcp_command = f"bcp {self.dbName}.dbo.{tableName}_View IN {file_path} -F {first_row} -c -b {self.bcp_batch_commit_size} -t{delimiter} -S {self.dbServer} -r {self.bcp_end_of_row} "
         if self.uid > '':
             bcp_command += f"-U {self.uid} -P {self.pwd}"
         else:
             bcp_command += "-T"
         try:
-            subprocess.run(bcp_command, shell=True)
+            process = subprocess.Popen(bcp_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            for line in process.stdout:
+                line = line.rstrip()
+                if not line:
+                    continue
+                if re.search(r'rows sent to SQL Server|Total sent:|Starting copy', line):
+                    logging.debug(line)
+                elif re.search(r'SQLState|Error', line):
+                    logging.error(f"bcp: {line}")
+                else:
+                    logging.info(f"bcp: {line}")
+            if process.wait() != 0:
+                raise RuntimeError(f"bcp exited with code {process.returncode}")
         except Exception as e:
-            print(f'BCP import failed: {e}')
+            logging.error(f'BCP import failed: {e}')
+            raise
         else:
-            print('BCP import succeeded')
+            logging.info('BCP import succeeded')
 
     def bulkInsert_import(self, file_path, tableName):
         conn = self.connect_to_database()
@@ -212,17 +936,21 @@ class ETLProcess:
             cursor.execute(sql)
             conn.commit()
         except pyodbc.Error as e:
-            print(f'BULK INSERT failed: {e}')
+            logging.error(f'BULK INSERT failed: {e}')
         else:
-            print('BULK INSERT succeeded')
+            logging.info('BULK INSERT succeeded')
         finally:
             cursor.close()
             conn.close()
 
-    def pandas_import(self, file_path, tableName):
+    def pandas_import(self, file_path, tableName, rows_committed=0):
         try:
             delimiter = self.field_delimiter.replace('"', '')
-            df = pd.read_csv(file_path, delimiter=delimiter, engine='python')
+            if rows_committed:
+                logging.info(f"Resuming pandas import of {file_path} after {rows_committed} committed rows")
+            reader = pd.read_csv(file_path, delimiter=delimiter, engine='python',
+                                 header=0 if self.file_has_header else None,
+                                 chunksize=int(self.bcp_batch_commit_size))
             def convert_values(val):
                 if isinstance(val, str):
                     val = val.strip('"')
@@ -233,23 +961,35 @@ class ETLProcess:
                     elif val == "<NA>":
                         return None
                 return val
-            df = df.apply(lambda col: col.apply(convert_values)).convert_dtypes()
-            df = df.astype(str)
             conn = self.connect_to_database()
             cursor = conn.cursor()
             cursor.execute(f"SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = '{tableName}_View' ORDER BY ORDINAL_POSITION")
             columns = ', '.join([f'[{row[0]}]' for row in cursor.fetchall()])
-            query = f"INSERT INTO {tableName}_View ({columns}) VALUES ({', '.join('?' * len(df.columns))})"
-            data = [tuple(row) for row in df.values]
-            cursor.executemany(query, data)
-            num_rows = len(df)
-            print(f'{num_rows} rows were imported.')
-            conn.commit()
+            num_rows = 0
+            # Committed rows are skipped as parsed records, not physical lines, so blank
+            # lines and quoted newlines cannot shift the resume point.
+            rows_to_skip = rows_committed
+            for df in reader:
+                if rows_to_skip:
+                    if rows_to_skip >= len(df):
+                        rows_to_skip -= len(df)
+                        continue
+                    df = df.iloc[rows_to_skip:]
+                    rows_to_skip = 0
+                df = df.apply(lambda col: col.apply(convert_values)).convert_dtypes()
+                df = df.astype(str)
+                query = f"INSERT INTO {tableName}_View ({columns}) VALUES ({', '.join('?' * len(df.columns))})"
+                data = [tuple(row) for row in df.values]
+                cursor.executemany(query, data)
+                conn.commit()
+                num_rows += len(df)
+            logging.info(f'{num_rows} rows were imported.')
             logging.info(f"Pandas data from {file_path} inserted successfully.")
         except Exception as e:
-            print(f'Pandas import failed: {e}')
+            logging.error(f'Pandas import failed: {e}')
+            raise
         else:
-            print('Pandas import succeeded')
+            logging.info('Pandas import succeeded')
         finally:
             cursor.close()
             conn.close()
@@ -272,22 +1012,22 @@ class ETLProcess:
             'json': self.handle_json,
         }
         try:
-            print(f"Processing file: {file_path}")
+            logging.info(f"Processing file: {file_path}")
             if file_path.endswith('.zip'):
-                print(f"Extracting file: {file_path}")
+                logging.info(f"Extracting file: {file_path}")
                 self.extract_file_if_compressed(file_path)
             directory_path = os.path.dirname(file_path)
-            print(f"Processing files in directory: {directory_path}")
+            logging.info(f"Processing files in directory: {directory_path}")
+            skipped_files = 0
             for root, dirs, files in os.walk(directory_path):
                 for file in files:
-                    print(f"Processing file: {file}")
                     if file.endswith(self.file_suffix + '.' + self.file_type):
                         csv_file_path = os.path.join(root, file)
-                        print(f"Valid file found: {csv_file_path}")
                         try:
                             handler = file_type_handlers[self.file_type]
-                            print(f"Processing {self.file_type} file: {csv_file_path}")
+                            logging.info(f"Processing {self.file_type} file: {csv_file_path}")
                             handler(csv_file_path, tableName)
+                            self.checkpoints.complete(csv_file_path, tableName)
                             self.drop_table_if_exists = False
                             logging.info(f"Processed {self.file_type} file: {csv_file_path}")
                         except Exception as e:
@@ -300,20 +1040,66 @@ class ETLProcess:
                         except Exception as e:
                             logging.error(f"Error moving file {csv_file_path} to archive: {str(e)}")
                     else:
-                        print(f"Invalid file found: {file}")
-                        print(f"Expected file suffix: {self.file_suffix + '.' + self.file_type}")
+                        skipped_files += 1
+                        logging.debug(f"Invalid file found: {file}")
+            if skipped_files:
+                logging.info(f"Skipped {skipped_files} files without the expected suffix {self.file_suffix + '.' + self.file_type}")
         except Exception as e:
             logging.error(f"Error in process_file method: {str(e)}")
 
     def handle_csv(self, file_path, table_name):
         logging.info(f"Processing CSV file: {file_path}")
+        self.start_table(table_name)
+        if self.checkpoints.is_completed(file_path, table_name):
+            logging.info(f"Skipping {file_path}: already loaded into {table_name} by the interrupted run")
+            return
+        deduplicator = None
+        load_name = None
+        rec_id_ranges = None
         try:
             delimiter = self.field_delimiter
             if self.file_has_header:
                 self._create_table_from_csv_header(file_path, table_name)
-            self._import_data(file_path, table_name)
+            deduplicator = self.get_deduplicator(table_name)
+            rows_committed, rec_id_ranges = self.begin_load(file_path, table_name)
+            load_path = file_path
+            if deduplicator:
+                load_name = self.checkpoints.load_name(file_path, table_name)
+                load_path, duplicates = deduplicator.filter_csv(file_path, delimiter, self.file_has_header,
+                                                                self.dedup_key_columns, load_name, rows_committed)
+                self.report_entry(file_path, table_name)['duplicates_dropped'] = duplicates
+            source_scan = cancel_scan = None
+            if self.reconcile_load:
+                source_scan, cancel_scan = self.start_source_scan(load_path)
+            try:
+                self._import_data(load_path, table_name, rows_committed)
+            except Exception:
+                if source_scan:
+                    # Stop the scan rather than let it read the rest of the file; it then
+                    # finishes within a block and releases the file.
+                    cancel_scan.set()
+                    source_scan.exception()
+                raise
+            if source_scan:
+                self.reconcile_file(load_path, table_name, rec_id_ranges, source_scan)
+            if deduplicator:
+                deduplicator.commit()
+                deduplicator.release(load_name)
         except Exception as e:
             logging.error(f"Error processing CSV file {file_path}: {e}")
+            if deduplicator:
+                self._store_loaded_keys(deduplicator, load_name, table_name, rec_id_ranges)
+            raise
+
+    def _store_loaded_keys(self, deduplicator, load_name, table_name, rec_id_ranges):
+        deduplicator.discard()
+        if load_name is None or rec_id_ranges is None:
+            return
+        try:
+            deduplicator.store_loaded(load_name, self._count_rows(table_name, rec_id_ranges))
+        except Exception as e:
+            # The resumed load stores them instead, before it filters anything.
+            logging.warning(f"Could not record the rows committed to {table_name} before the failure: {e}")
 
     def _create_table_from_csv_header(self, file_path, table_name):
         with open(file_path, 'r') as csvfile:
@@ -322,16 +1108,202 @@ class ETLProcess:
             columns_sql = ['[' + column + '] varchar(max)' for column in columns]
         self.create_table_and_view(columns_sql, table_name)
 
-    def _import_data(self, file_path, table_name):
+    def _import_data(self, file_path, table_name, rows_committed=0):
         try:
             if self.bcp_import_bool:
-                self.bcp_import(file_path, table_name)
+                self.bcp_import(file_path, table_name, rows_committed)
             elif self.pandas_import_bool:
-                self.pandas_import(file_path, table_name)
+                self.pandas_import(file_path, table_name, rows_committed)
             else:
                 logging.warning("No import method selected")
         except Exception as e:
             logging.error(f"Error importing data from {file_path} to {table_name}: {e}")
+            raise
+
+    def start_table(self, table_name):
+        # Once per run. An interrupted load is only resumed while its file is still in the
+        # input and has attempts left; with nothing left to resume, forget the previous
+        # run's checkpoints.
+        if table_name in self.started_tables:
+            return
+        self.started_tables.add(table_name)
+        for key, checkpoint in self.checkpoints.incomplete(table_name).items():
+            if not self.checkpoints.in_input(key):
+                logging.warning(f"Abandoning the interrupted load of {checkpoint['file']} into {table_name}: the file is not in this run's input")
+                self.checkpoints.remove(key)
+            elif len(checkpoint['ranges']) >= self.checkpoint_max_attempts:
+                logging.warning(f"Abandoning the interrupted load of {checkpoint['file']} into {table_name} after {len(checkpoint['ranges'])} attempts")
+                self.checkpoints.remove(key)
+        if self.checkpoints.has_incomplete(table_name):
+            logging.info(f"Resuming interrupted load into {table_name}")
+        else:
+            self.checkpoints.clear_table(table_name)
+
+    def begin_load(self, file_path, table_name):
+        # Resume from what the target actually holds, not from reported progress.
+        try:
+            max_rec_id = self._max_rec_id(table_name)
+            checkpoint = self.checkpoints.get(file_path, table_name)
+            rows_committed = self._count_rows(table_name, checkpoint['ranges']) if checkpoint else 0
+        except Exception as e:
+            logging.warning(f"Checkpointing is unavailable for {table_name}: {e}")
+            return 0, None
+        rec_id_ranges = self.checkpoints.begin(file_path, table_name, max_rec_id)
+        if rows_committed:
+            logging.info(f"{rows_committed} rows of {file_path} are already committed to {table_name}")
+        return rows_committed, rec_id_ranges
+
+    @staticmethod
+    def _rec_id_filter(rec_id_ranges):
+        conditions = []
+        params = []
+        for after_rec_id, last_rec_id in rec_id_ranges:
+            if last_rec_id is None:
+                conditions.append("RecId > ?")
+                params.append(after_rec_id)
+            else:
+                conditions.append("(RecId > ? AND RecId <= ?)")
+                params += [after_rec_id, last_rec_id]
+        return ' OR '.join(conditions), params
+
+    def _count_rows(self, table_name, rec_id_ranges):
+        conn = self.connect_to_database()
+        cursor = conn.cursor()
+        try:
+            condition, params = self._rec_id_filter(rec_id_ranges)
+            cursor.execute(f"SELECT COUNT_BIG(*) FROM {table_name} WHERE {condition}", params)
+            return int(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _max_rec_id(self, table_name):
+        conn = self.connect_to_database()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT COALESCE(MAX(RecId), 0) FROM {table_name}")
+            return int(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _table_aggregates(self, table_name, rec_id_ranges):
+        conn = self.connect_to_database()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = N'{table_name}' ORDER BY ORDINAL_POSITION")
+            columns = [row[0] for row in cursor.fetchall()][1:]
+            aggregates = ['COUNT_BIG(*)']
+            for column in columns:
+                aggregates += [
+                    f"COUNT_BIG([{column}])",
+                    # Measured as VARCHAR so NVARCHAR columns are not counted at two bytes a character.
+                    f"COALESCE(SUM(CAST(DATALENGTH(CAST([{column}] AS VARCHAR(MAX))) AS BIGINT)), 0)",
+                    f"COALESCE(SUM(CAST(ASCII(CAST([{column}] AS VARCHAR(MAX))) AS BIGINT)), 0)",
+                ]
+            condition, params = self._rec_id_filter(rec_id_ranges)
+            cursor.execute(f"SELECT {', '.join(aggregates)} FROM {table_name} WHERE {condition}", params)
+            result = [int(value) for value in cursor.fetchone()]
+        finally:
+            cursor.close()
+            conn.close()
+        return {
+            'columns': columns,
+            'rows': result[0],
+            'value_counts': result[1::3],
+            'length_sums': result[2::3],
+            'first_char_sums': result[3::3],
+        }
+
+    def start_source_scan(self, file_path):
+        # The scan only reads the source file and numpy releases the GIL, so it runs
+        # alongside the import instead of after it. Setting the returned event stops it
+        # at the next block.
+        cancel = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='source-scan')
+        future = executor.submit(self._scan_source, file_path, cancel)
+        executor.shutdown(wait=False)
+        return future, cancel
+
+    def _scan_source(self, file_path, cancel=None):
+        start_time = time.monotonic()
+        # bcp starts at bcp_row_start; pandas reads a header line only when the file has one.
+        skip_rows = int(self.bcp_row_start) - 1 if self.bcp_import_bool else int(bool(self.file_has_header))
+        scanner = DelimitedFileScanner(self.field_delimiter.replace('"', ''), skip_rows,
+                                       strip_cr=self.bcp_end_of_row != '0x0A')
+        source = scanner.scan(file_path, cancel)
+        source['seconds'] = round(time.monotonic() - start_time, 3)
+        return source
+
+    def report_entry(self, file_path, table_name):
+        for entry in self.run_report:
+            if entry['file'] == file_path and entry['table'] == table_name:
+                return entry
+        entry = {'file': file_path, 'table': table_name}
+        self.run_report.append(entry)
+        return entry
+
+    def reconcile_file(self, file_path, table_name, rec_id_ranges, source_scan):
+        entry = self.report_entry(file_path, table_name)
+        entry.update({'status': 'ok', 'mismatches': []})
+        try:
+            source = source_scan.result()
+            entry['scan_seconds'] = source['seconds']
+            if rec_id_ranges is None:
+                raise RuntimeError("no RecId baseline was recorded before the load")
+            start_time = time.monotonic()
+            target = self._table_aggregates(table_name, rec_id_ranges)
+            entry['source_rows'] = source['rows']
+            entry['loaded_rows'] = target['rows']
+            if source['rows'] != target['rows']:
+                entry['mismatches'].append(f"row count: source {source['rows']}, loaded {target['rows']}")
+            # pandas_import rewrites values before inserting, so only bcp loads are compared column by column.
+            if self.bcp_import_bool:
+                non_ascii = source['non_ascii_counts'] + [0] * (len(target['columns']) - len(source['non_ascii_counts']))
+                non_ascii_columns = {column: count for column, count in zip(target['columns'], non_ascii) if count}
+                if non_ascii_columns:
+                    # bcp converts these through a code page, so their bytes cannot be compared.
+                    entry['non_ascii_values'] = non_ascii_columns
+                for metric in ('value_counts', 'length_sums', 'first_char_sums'):
+                    source_values = source[metric] + [0] * (len(target['columns']) - len(source[metric]))
+                    for column, source_value, target_value in zip(target['columns'], source_values, target[metric]):
+                        if metric != 'value_counts' and column in non_ascii_columns:
+                            continue
+                        if source_value != target_value:
+                            entry['mismatches'].append(f"{column} {metric}: source {source_value}, loaded {target_value}")
+                    if len(source[metric]) > len(target['columns']) and any(source[metric][len(target['columns']):]):
+                        entry['mismatches'].append(f"{metric}: source has {len(source[metric])} columns, table has {len(target['columns'])}")
+            if entry['mismatches']:
+                entry['status'] = 'mismatch'
+                logging.error(f"Reconciliation mismatch for {file_path} in {table_name}: {'; '.join(entry['mismatches'])}")
+            else:
+                logging.info(f"Reconciled {source['rows']} rows from {file_path} in {table_name}")
+            entry['query_seconds'] = round(time.monotonic() - start_time, 3)
+        except Exception as e:
+            entry['status'] = 'error'
+            entry['mismatches'].append(str(e))
+            logging.error(f"Reconciliation failed for {file_path} in {table_name}: {e}")
+        return entry
+
+    def run_report_summary(self):
+        reconciled = [entry for entry in self.run_report if 'status' in entry]
+        matched = sum(1 for entry in reconciled if entry['status'] == 'ok')
+        summary = f"Reconciled {len(reconciled)} files: {matched} matched, {len(reconciled) - matched} with mismatches or errors."
+        for entry in reconciled:
+            if entry['status'] != 'ok':
+                summary += f"\n{entry['file']} -> {entry['table']}: {'; '.join(entry['mismatches'])}"
+        deduplicated = [entry for entry in self.run_report if 'duplicates_dropped' in entry]
+        if deduplicated:
+            summary += f"\nDropped {sum(entry['duplicates_dropped'] for entry in deduplicated)} duplicate rows:"
+            for entry in deduplicated:
+                summary += f"\n{entry['file']} -> {entry['table']}: {entry['duplicates_dropped']}"
+        return summary
+
+    def write_run_report(self):
+        report_file = self.log_stem + '_report.json'
+        with open(report_file, 'w') as f:
+            json.dump({'job': self.job_name, 'files': self.run_report}, f, indent=2)
+        logging.info(f"Run report written to {report_file}")
 
     def create_table_and_view(self, columns_sql, tableName):
         try:
@@ -339,7 +1311,13 @@ class ETLProcess:
             cursor = conn.cursor()
             if isinstance(columns_sql, str):
                 columns_sql = columns_sql.split(', ')
+            if self.drop_table_if_exists and self.checkpoints.has_incomplete(tableName):
+                blocking = [checkpoint['file'] for checkpoint in self.checkpoints.incomplete(tableName).values()]
+                logging.warning(f"Not dropping {tableName}: it holds rows of the interrupted load of {', '.join(blocking)}")
+                self.drop_table_if_exists = False
             if self.drop_table_if_exists:
+                self.checkpoints.clear_table(tableName)
+                self.reset_deduplicator(tableName)
                 drop_table_query = f"IF EXISTS (SELECT * FROM sys.tables WHERE name = N'{tableName}' AND type = 'U') DROP TABLE {tableName}"
                 cursor.execute(drop_table_query)
                 conn.commit()
@@ -365,24 +1343,47 @@ class ETLProcess:
             conn.close()
 
     def handle_json(self, file_path, tableName):
+        self.start_table(tableName)
+        if self.checkpoints.is_completed(file_path, tableName):
+            logging.info(f"Skipping {file_path}: already loaded into {tableName} by the interrupted run")
+            return
+        deduplicator = None
+        load_name = None
+        rec_id_ranges = None
         try:
             conn = self.connect_to_database()
             cursor = conn.cursor()
             with open(file_path, 'r') as f:
                 data = json.load(f)
-            columns = data[0].keys()
-            columns_sql = ', '.join(f"[{column}] NVARCHAR(MAX)" for column in columns)
-            self.create_table_and_view(columns_sql, tableName)
-            for item in data:
+            if data:
+                columns = data[0].keys()
+                columns_sql = ', '.join(f"[{column}] NVARCHAR(MAX)" for column in columns)
+                self.create_table_and_view(columns_sql, tableName)
+            deduplicator = self.get_deduplicator(tableName)
+            rows_committed, rec_id_ranges = self.begin_load(file_path, tableName)
+            if deduplicator:
+                load_name = self.checkpoints.load_name(file_path, tableName)
+                data, duplicates = deduplicator.filter_records(data, self.dedup_key_columns, load_name, rows_committed)
+                self.report_entry(file_path, tableName)['duplicates_dropped'] = duplicates
+            batch_size = int(self.bcp_batch_commit_size)
+            for row_number, item in enumerate(data[rows_committed:], start=rows_committed + 1):
                 columns_str = ', '.join(item.keys())
                 values_str = ', '.join(f"'{value}'" for value in item.values())
                 insert_query = f"INSERT INTO {tableName} ({columns_str}) VALUES ({values_str})"
                 cursor.execute(insert_query)
+                if row_number % batch_size == 0:
+                    conn.commit()
             conn.commit()
+            if deduplicator:
+                deduplicator.commit()
+                deduplicator.release(load_name)
             logging.info(f"JSON data from {file_path} inserted successfully.")
         except Exception as e:
             logging.error(f"Error processing file {file_path}: {str(e)}")
             conn.rollback()
+            if deduplicator:
+                self._store_loaded_keys(deduplicator, load_name, tableName, rec_id_ranges)
+            raise
         finally:
             cursor.close()
             conn.close()
@@ -402,10 +1403,11 @@ class ETLProcess:
                     self.empty_folder_of_zip_csv(downloadPath)
                     file_path = os.path.join(downloadPath, f'{url.split("/")[-1]}')
                     self.download_from_url(url, file_path)
+                    self.start_table(table_name)
                     if not file_has_header:
                         columns_sql = ', '.join(f"[{column}] NVARCHAR(MAX)" for column in column_names.split(',') if column.strip())
                         self.create_table_and_view(columns_sql, table_name)
-                    print(f"Processing file: {file_path}")
+                    logging.info(f"Processing file: {file_path}")
                     self.process_file(file_path, archivePath, table_name)
                 except requests.exceptions.MissingSchema:
                     logging.error(f"Invalid URL: {url}")
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+try:
+    import pyodbc
+except ImportError:
+    # pyodbc fails to import without the ODBC driver manager; the tests replace
+    # connect_to_database, so only the module name and its Error type are needed.
+    pyodbc = types.ModuleType('pyodbc')
+    pyodbc.Error = type('Error', (Exception,), {})
+    sys.modules['pyodbc'] = pyodbc
+
+
+class CountBig:
+    def __init__(self):
+        self.count = 0
+
+    def step(self, *values):
+        self.count += 1
+
+    def finalize(self):
+        return self.count
+
+
+class FakeTarget:
+    # A file-backed sqlite database that answers the T-SQL the loaders issue.
+    def __init__(self, path, table_name, columns):
+        self.path = str(path)
+        self.schema_path = self.path + '.schema'
+        self.fail_after_batches = None
+        self.batches = 0
+        conn = self.connect().conn
+        conn.execute(f"CREATE TABLE {table_name} (RecId INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     f"{', '.join(f'[{column}] TEXT' for column in columns)})")
+        conn.execute(f"CREATE VIEW {table_name}_View AS SELECT {', '.join(f'[{column}]' for column in columns)} FROM {table_name}")
+        conn.execute(f"CREATE TRIGGER {table_name}_View_insert INSTEAD OF INSERT ON {table_name}_View BEGIN "
+                     f"INSERT INTO {table_name} ({', '.join(f'[{column}]' for column in columns)}) "
+                     f"VALUES ({', '.join(f'NEW.[{column}]' for column in columns)}); END")
+        conn.execute("CREATE TABLE INFORMATION_SCHEMA.COLUMNS (TABLE_NAME TEXT, COLUMN_NAME TEXT, ORDINAL_POSITION INT)")
+        for view_name, names in ((table_name, ['RecId'] + columns), (f'{table_name}_View', columns)):
+            for position, column in enumerate(names, start=1):
+                conn.execute("INSERT INTO INFORMATION_SCHEMA.COLUMNS VALUES (?, ?, ?)", (view_name, column, position))
+        conn.commit()
+        conn.close()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("ATTACH DATABASE ? AS INFORMATION_SCHEMA", (self.schema_path,))
+        conn.create_aggregate('COUNT_BIG', -1, CountBig)
+        return FlakyConnection(conn, self)
+
+    def rows(self, table_name):
+        conn = sqlite3.connect(self.path)
+        rows = conn.execute(f"SELECT [id] FROM {table_name} ORDER BY RecId").fetchall()
+        conn.close()
+        return [row[0] for row in rows]
+
+
+class FlakyConnection:
+    # Dies on the Nth batch insert, as if the load process were killed mid-file.
+    def __init__(self, conn, target):
+        self.conn = conn
+        self.target = target
+
+    def cursor(self):
+        return FlakyCursor(self.conn.cursor(), self.target)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+class FlakyCursor:
+    def __init__(self, cursor, target):
+        self.cursor = cursor
+        self.target = target
+
+    def execute(self, sql, *params):
+        self.cursor.execute(sql, *params)
+        return self
+
+    def executemany(self, sql, rows):
+        self.target.batches += 1
+        if self.target.fail_after_batches is not None and self.target.batches > self.target.fail_after_batches:
+            raise RuntimeError("load process killed")
+        self.cursor.executemany(sql, rows)
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+
+class FakeSSM:
+    def get_parameter(self, Name, WithDecryption):
+        return {'Parameter': {'Value': ''}}
+
+
+@pytest.fixture
+def make_etl(tmp_path, monkeypatch):
+    etlModule = pytest.importorskip('etlModule')
+    monkeypatch.setattr(etlModule.boto3, 'client', lambda *args, **kwargs: FakeSSM())
+    config_file = tmp_path / 'config_test.ini'
+    config_file.write_text(f"""[ETL]
+database_type = mssql
+file_type = csv
+field_delimiter = ,
+file_has_header = True
+bcp_row_start = 2
+bcp_batch_commit_size = 100
+bcp_end_of_row = 0x0A
+archive_path = {tmp_path / 'archive'}
+log_path = {tmp_path / 'logs'}
+checkpoint_path = {tmp_path / 'checkpoints'}
+file_name =
+file_prefix =
+file_suffix =
+file_extensions = csv
+reconcile_load = False
+
+[IMPORT_METHOD]
+bcp_import = False
+bulkInsert_import = False
+pandas_import = True
+
+[MSSQL]
+server = localhost
+database = test
+user =
+table_name = Loads
+drop_table_if_exists = False
+
+[EMAIL]
+smtp_server = localhost
+smtp_port = 25
+recipient = etl@example.com
+""")
+    target = FakeTarget(tmp_path / 'target.db', 'Loads', ['id', 'value'])
+    processes = []
+
+    def make():
+        etl = etlModule.ETLProcess(str(config_file))
+        etl.connect_to_database = target.connect
+        processes.append(etl)
+        return etl
+
+    yield make, target
+    for etl in processes:
+        etl.close()
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+for module in ('pandas', 'boto3', 'paramiko', 'sqlalchemy', 'requests'):
+    pytest.importorskip(module)
+
+
+def write_csv(path, ids):
+    path.write_text('id,value\n' + ''.join(f'{i},value {i}\n' for i in ids))
+    return str(path)
+
+
+def test_interrupted_load_resumes_without_duplicates(tmp_path, make_etl):
+    make, target = make_etl
+    source = write_csv(tmp_path / 'big.csv', range(2500))
+
+    target.fail_after_batches = 7
+    with pytest.raises(RuntimeError):
+        make().handle_csv(source, 'Loads')
+    assert len(target.rows('Loads')) == 700
+
+    target.fail_after_batches = None
+    make().handle_csv(source, 'Loads')
+    assert target.rows('Loads') == [str(i) for i in range(2500)]
+
+
+def test_resume_ignores_rows_loaded_by_later_files(tmp_path, make_etl):
+    make, target = make_etl
+    first = write_csv(tmp_path / 'first.csv', range(1000))
+    second = write_csv(tmp_path / 'second.csv', range(5000, 5300))
+
+    etl = make()
+    target.fail_after_batches = 4
+    with pytest.raises(RuntimeError):
+        etl.handle_csv(first, 'Loads')
+    target.fail_after_batches = None
+    etl.handle_csv(second, 'Loads')
+    etl.checkpoints.complete(second, 'Loads')
+
+    resumed = make()
+    resumed.handle_csv(second, 'Loads')
+    resumed.handle_csv(first, 'Loads')
+    assert sorted(target.rows('Loads'), key=int) == [str(i) for i in list(range(1000)) + list(range(5000, 5300))]
+
+
+def test_table_is_not_dropped_while_a_load_is_incomplete(tmp_path, make_etl):
+    make, target = make_etl
+    source = write_csv(tmp_path / 'big.csv', range(500))
+
+    target.fail_after_batches = 2
+    with pytest.raises(RuntimeError):
+        make().handle_csv(source, 'Loads')
+
+    etl = make()
+    etl.drop_table_if_exists = True
+    etl.start_table('Loads')
+    etl.create_table_and_view(['[id] varchar(max)', '[value] varchar(max)'], 'Loads')
+    assert etl.drop_table_if_exists is False
+    assert len(target.rows('Loads')) == 200
+
+
+def test_drop_is_not_blocked_by_a_file_that_left_the_input(tmp_path, make_etl):
+    make, target = make_etl
+    source = write_csv(tmp_path / 'big.csv', range(500))
+
+    target.fail_after_batches = 2
+    with pytest.raises(RuntimeError):
+        make().handle_csv(source, 'Loads')
+    os.remove(source)
+
+    etl = make()
+    etl.drop_table_if_exists = True
+    etl.start_table('Loads')
+    etl.create_table_and_view(['[id] varchar(max)', '[value] varchar(max)'], 'Loads')
+    assert etl.drop_table_if_exists is True
+    assert not etl.checkpoints.has_incomplete('Loads')
+
+
+def test_drop_is_not_blocked_by_a_file_that_keeps_failing(tmp_path, make_etl):
+    make, target = make_etl
+    source = write_csv(tmp_path / 'big.csv', range(500))
+
+    target.fail_after_batches = 1
+    for attempt in range(3):
+        target.batches = 0
+        with pytest.raises(RuntimeError):
+            make().handle_csv(source, 'Loads')
+    assert len(target.rows('Loads')) == 300
+
+    etl = make()
+    etl.drop_table_if_exists = True
+    etl.start_table('Loads')
+    etl.create_table_and_view(['[id] varchar(max)', '[value] varchar(max)'], 'Loads')
+    assert etl.drop_table_if_exists is True
+    assert not etl.checkpoints.has_incomplete('Loads')
@@ -0,0 +1,153 @@
+import configparser
+import glob
+import json
+import logging
+import socket
+import threading
+import time
+import types
+
+import pytest
+
+for module in ('pandas', 'boto3', 'paramiko', 'sqlalchemy', 'requests'):
+    pytest.importorskip(module)
+
+import etlModule
+
+
+class FakeSMTPServer:
+    # Just enough of SMTP for smtplib; fail_mail drops the connection on that MAIL command.
+    def __init__(self, fail_mail=None):
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.fail_mail = fail_mail
+        self.mail_commands = 0
+        self.connections = 0
+        self.subjects = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._session, args=(conn,), daemon=True).start()
+
+    def _session(self, conn):
+        lines = conn.makefile('rb')
+        conn.sendall(b'220 fake\r\n')
+        for line in lines:
+            command = line[:4].upper()
+            if command == b'MAIL':
+                self.mail_commands += 1
+                if self.mail_commands == self.fail_mail:
+                    break
+            if command == b'DATA':
+                conn.sendall(b'354 go ahead\r\n')
+                message = []
+                for data_line in lines:
+                    if data_line == b'.\r\n':
+                        break
+                    message.append(data_line)
+                self.subjects += [data_line[len(b'Subject: '):].decode().strip()
+                                  for data_line in message if data_line.startswith(b'Subject: ')]
+                conn.sendall(b'250 queued\r\n')
+            elif command == b'QUIT':
+                conn.sendall(b'221 bye\r\n')
+                break
+            else:
+                conn.sendall(b'250 ok\r\n')
+        conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def make_email(monkeypatch):
+    ssm = types.SimpleNamespace(get_parameter=lambda **kwargs: {'Parameter': {'Value': ''}})
+    monkeypatch.setattr(etlModule.boto3, 'client', lambda *args, **kwargs: ssm)
+    utilities = []
+
+    def make(port, **kwargs):
+        config = configparser.ConfigParser()
+        config.read_dict({'EMAIL': {'smtp_server': '127.0.0.1', 'smtp_port': str(port),
+                                    'smtp_starttls': 'False', 'recipient': 'etl@example.com'}})
+        utility = etlModule.EmailUtility(config['EMAIL'], **kwargs)
+        utilities.append(utility)
+        return utility
+
+    yield make
+    for utility in utilities:
+        utility.close()
+
+
+def test_queued_messages_share_one_connection(make_email):
+    server = FakeSMTPServer()
+    email = make_email(server.port, batch_window=1.0)
+    for i in range(8):
+        email.send_email(f'message {i}', 'body')
+    email.close(timeout=10)
+    assert server.subjects == [f'message {i}' for i in range(8)]
+    assert server.connections == 1
+    server.close()
+
+
+def test_close_flushes_queued_messages(make_email):
+    server = FakeSMTPServer()
+    email = make_email(server.port, batch_window=60.0)
+    email.send_email('first', 'body')
+    email.send_email('second', 'body')
+    started = time.monotonic()
+    email.close(timeout=10)
+    assert time.monotonic() - started < 10
+    assert server.subjects == ['first', 'second']
+    server.close()
+
+
+def test_dropped_connection_is_retried_once(make_email):
+    server = FakeSMTPServer(fail_mail=2)
+    email = make_email(server.port)
+    for i in range(3):
+        email.send_email(f'message {i}', 'body')
+    email.close(timeout=10)
+    assert server.subjects == ['message 0', 'message 1', 'message 2']
+    assert server.connections == 2
+    server.close()
+
+
+def test_undelivered_subjects_are_logged(make_email, caplog):
+    unused = socket.socket()
+    unused.bind(('127.0.0.1', 0))
+    port = unused.getsockname()[1]
+    unused.close()
+    email = make_email(port)
+    with caplog.at_level(logging.ERROR):
+        email.send_email('first', 'body')
+        email.send_email('second', 'body')
+        email.close(timeout=10)
+    assert 'Email not delivered: first' in caplog.text
+    assert 'Email not delivered: second' in caplog.text
+
+
+def test_job_log_is_json_with_the_exception(tmp_path, make_etl):
+    make, target = make_etl
+    etl = make()
+    try:
+        raise ValueError('bad row')
+    except ValueError:
+        logging.exception('Load failed')
+    etl.close()
+
+    log_files = glob.glob(str(tmp_path / 'logs' / 'config_test_*.log'))
+    assert len(log_files) == 1
+    with open(log_files[0]) as f:
+        entries = [json.loads(line) for line in f]
+    failure = next(entry for entry in entries if entry['message'] == 'Load failed')
+    assert failure['level'] == 'ERROR'
+    assert failure['job'] == 'config_test'
+    assert 'ValueError: bad row' in failure['exception']
@@ -0,0 +1,141 @@
+import threading
+
+import pytest
+
+for module in ('pandas', 'boto3', 'paramiko', 'sqlalchemy', 'requests'):
+    pytest.importorskip(module)
+
+from etlModule import DelimitedFileScanner
+
+
+@pytest.fixture(params=[1, 2, 3, 7, 1 << 20])
+def scan(request, tmp_path, monkeypatch):
+    # Tiny blocks put every field, quote and row end across a block boundary somewhere.
+    monkeypatch.setattr(DelimitedFileScanner, 'BLOCK_SIZE', request.param)
+
+    def scan(content, delimiter=',', **kwargs):
+        path = tmp_path / 'source.csv'
+        path.write_bytes(content)
+        return DelimitedFileScanner(delimiter, **kwargs).scan(str(path))
+    return scan
+
+
+def test_quoted_delimiters_and_newlines(scan):
+    result = scan(b'id,value\n"1,5","a\nb"\n2,"c,d"\n', skip_rows=1)
+    assert result == {'rows': 2, 'value_counts': [2, 2], 'non_ascii_counts': [0, 0],
+                      'length_sums': [6, 10], 'first_char_sums': [34 + 50, 34 + 34]}
+
+
+def test_carriage_returns(scan):
+    assert scan(b'ab,c\r\nd,ef\r\n', strip_cr=True)['length_sums'] == [3, 3]
+    assert scan(b'ab,c\r\nd,ef\r\n', strip_cr=False)['length_sums'] == [3, 5]
+    assert scan(b'ab,c\nd,e\rf\n', strip_cr=False)['length_sums'] == [3, 4]
+
+
+def test_blank_lines_and_empty_fields(scan):
+    result = scan(b'a,b\n\n,c\n\n\na,\n')
+    assert result['rows'] == 3
+    assert result['value_counts'] == [2, 2]
+
+
+def test_last_row_without_newline(scan):
+    result = scan(b'a,b\nc,de')
+    assert result['rows'] == 2
+    assert result['length_sums'] == [2, 3]
+    assert scan(b'a,b\nc,')['value_counts'] == [2, 1]
+
+
+def test_skip_rows_steps_over_quoted_newlines(scan):
+    result = scan(b'report\n"first\nheader",x\n1,2\n3,4\n', skip_rows=2)
+    assert result['rows'] == 2
+    assert result['first_char_sums'] == [ord('1') + ord('3'), ord('2') + ord('4')]
+    assert scan(b'h\n1\n', skip_rows=5)['rows'] == 0
+
+
+def test_non_ascii_values_are_counted_per_column(scan):
+    result = scan('a,café\nü,b\nc,"日,x"\n'.encode('utf-8'), delimiter=',')
+    assert result['value_counts'] == [3, 3]
+    assert result['non_ascii_counts'] == [1, 2]
+
+
+def test_tab_delimiter(scan):
+    result = scan(b'a\tb,c\n', delimiter='\t')
+    assert result['value_counts'] == [1, 1]
+    assert result['length_sums'] == [1, 3]
+
+
+def test_cancelled_scan_stops(tmp_path, monkeypatch):
+    monkeypatch.setattr(DelimitedFileScanner, 'BLOCK_SIZE', 4)
+    path = tmp_path / 'source.csv'
+    path.write_bytes(b'a,b\n' * 100)
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(RuntimeError):
+        DelimitedFileScanner(',').scan(str(path), cancel)
+
+
+@pytest.fixture
+def reconciling_etl(tmp_path, make_etl):
+    make, target = make_etl
+    etl = make()
+    etl.bcp_import_bool = True
+    etl.pandas_import_bool = False
+    source = tmp_path / 'source.csv'
+    source.write_bytes('id,value\n1,café\n22,b\n'.encode('utf-8'))
+    return etl, str(source)
+
+
+def aggregates(rows=2, value_counts=(2, 2), length_sums=(3, 99), first_char_sums=(99, 0)):
+    return {'columns': ['id', 'value'], 'rows': rows, 'value_counts': list(value_counts),
+            'length_sums': list(length_sums), 'first_char_sums': list(first_char_sums)}
+
+
+def test_reconcile_skips_byte_checks_for_non_ascii_columns(reconciling_etl):
+    etl, source = reconciling_etl
+    etl._table_aggregates = lambda table_name, rec_id_ranges: aggregates()
+    future, cancel = etl.start_source_scan(source)
+    entry = etl.reconcile_file(source, 'Loads', [[0, None]], future)
+    assert entry['status'] == 'ok', entry['mismatches']
+    assert entry['non_ascii_values'] == {'value': 1}
+    assert 'Reconciled 1 files: 1 matched' in etl.run_report_summary()
+
+
+def test_reconcile_reports_mismatches(reconciling_etl):
+    etl, source = reconciling_etl
+    etl._table_aggregates = lambda table_name, rec_id_ranges: aggregates(rows=3, length_sums=(4, 99))
+    future, cancel = etl.start_source_scan(source)
+    entry = etl.reconcile_file(source, 'Loads', [[0, None]], future)
+    assert entry['status'] == 'mismatch'
+    assert entry['mismatches'] == ['row count: source 2, loaded 3', 'id length_sums: source 3, loaded 4']
+    assert f"{source} -> Loads: row count: source 2, loaded 3" in etl.run_report_summary()
+
+
+def test_reconcile_reports_errors(reconciling_etl):
+    etl, source = reconciling_etl
+    def lost_connection(table_name, rec_id_ranges):
+        raise RuntimeError('connection lost')
+    etl._table_aggregates = lost_connection
+    future, cancel = etl.start_source_scan(source)
+    entry = etl.reconcile_file(source, 'Loads', [[0, None]], future)
+    assert entry['status'] == 'error'
+    assert entry['mismatches'] == ['connection lost']
+
+    future, cancel = etl.start_source_scan(source)
+    entry = etl.reconcile_file(source, 'Other', None, future)
+    assert entry['status'] == 'error'
+    assert 'Reconciled 2 files: 0 matched, 2 with mismatches or errors.' in etl.run_report_summary()
+
+
+def test_headerless_pandas_load_matches_the_scan(tmp_path, make_etl):
+    make, target = make_etl
+    etl = make()
+    etl.file_has_header = False
+    etl.reconcile_load = True
+    etl._table_aggregates = lambda table_name, rec_id_ranges: {
+        'columns': ['id', 'value'], 'rows': len(target.rows(table_name)),
+        'value_counts': [], 'length_sums': [], 'first_char_sums': []}
+    source = tmp_path / 'headerless.csv'
+    source.write_text(''.join(f'{i},value {i}\n' for i in range(250)))
+    etl.handle_csv(str(source), 'Loads')
+    assert target.rows('Loads') == [str(i) for i in range(250)]
+    assert etl.run_report[-1]['status'] == 'ok', etl.run_report[-1]['mismatches']
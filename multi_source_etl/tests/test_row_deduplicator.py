@@ -0,0 +1,152 @@
+import glob
+import os
+
+import pytest
+
+for module in ('pandas', 'boto3', 'paramiko', 'sqlalchemy', 'requests'):
+    pytest.importorskip(module)
+
+from etlModule import RowDeduplicator
+
+
+def write_csv(path, ids):
+    path.write_text('id,value\n' + ''.join(f'{i},value {i}\n' for i in ids))
+    return str(path)
+
+
+def kept_ids(output_path):
+    with open(output_path) as f:
+        return [line.split(',')[0] for line in f.read().splitlines()[1:]]
+
+
+def load(deduplicator, source, load_name):
+    output_path, duplicates = deduplicator.filter_csv(source, ',', True, [], load_name)
+    ids = kept_ids(output_path)
+    deduplicator.commit()
+    deduplicator.release(load_name)
+    return ids, duplicates
+
+
+def test_duplicates_are_dropped_across_instances(tmp_path):
+    store = str(tmp_path / 'dedup')
+    first = RowDeduplicator(store, expected_rows=10000)
+    assert load(first, write_csv(tmp_path / 'a.csv', range(100)), 'a') == ([str(i) for i in range(100)], 0)
+    first.close()
+
+    second = RowDeduplicator(store, expected_rows=10000)
+    ids, duplicates = load(second, write_csv(tmp_path / 'b.csv', range(50, 150)), 'b')
+    assert ids == [str(i) for i in range(100, 150)]
+    assert duplicates == 50
+    second.close()
+
+
+def test_duplicates_within_a_file_are_dropped_across_chunks_and_spills(tmp_path, monkeypatch):
+    monkeypatch.setattr(RowDeduplicator, 'CHUNK_ROWS', 7)
+    deduplicator = RowDeduplicator(str(tmp_path / 'dedup'), expected_rows=10000, spill_rows=5)
+    source = write_csv(tmp_path / 'a.csv', [i % 23 for i in range(100)])
+
+    output_path, duplicates = deduplicator.filter_csv(source, ',', True, [], 'a')
+    assert kept_ids(output_path) == [str(i) for i in range(23)]
+    assert duplicates == 77
+    assert deduplicator.staged_spills
+    deduplicator.commit()
+    assert not glob.glob(str(tmp_path / 'dedup' / 'staged_*.bin'))
+
+    output_path, duplicates = deduplicator.filter_csv(source, ',', True, [], 'again')
+    assert kept_ids(output_path) == []
+    assert duplicates == 100
+    deduplicator.close()
+
+
+def test_key_columns_and_blank_lines(tmp_path):
+    deduplicator = RowDeduplicator(str(tmp_path / 'dedup'), expected_rows=10000)
+    source = tmp_path / 'a.csv'
+    source.write_text('id,value\n1,x\n\n2,y\n1,z\n')
+
+    output_path, duplicates = deduplicator.filter_csv(str(source), ',', True, ['id'], 'a')
+    with open(output_path) as f:
+        assert f.read() == 'id,value\n1,x\n2,y\n'
+    assert duplicates == 1
+    deduplicator.close()
+
+
+def test_discard_leaves_the_store_unchanged(tmp_path):
+    store = str(tmp_path / 'dedup')
+    deduplicator = RowDeduplicator(store, expected_rows=10000)
+    load(deduplicator, write_csv(tmp_path / 'a.csv', range(100)), 'a')
+    runs = sorted(glob.glob(os.path.join(store, 'keys_*.bin')))
+
+    source = write_csv(tmp_path / 'b.csv', range(100, 200))
+    deduplicator.filter_csv(source, ',', True, [], 'b')
+    deduplicator.discard()
+    assert sorted(glob.glob(os.path.join(store, 'keys_*.bin'))) == runs
+
+    ids, duplicates = load(deduplicator, source, 'b')
+    assert ids == [str(i) for i in range(100, 200)]
+    assert duplicates == 0
+    deduplicator.close()
+
+
+def test_compaction_keeps_few_runs_per_bucket(tmp_path):
+    store = str(tmp_path / 'dedup')
+    deduplicator = RowDeduplicator(store, expected_rows=100000)
+    for batch in range(32):
+        load(deduplicator, write_csv(tmp_path / f'{batch}.csv', range(batch * 500, (batch + 1) * 500)), str(batch))
+    assert max(len(bucket_runs) for bucket_runs in deduplicator.runs.values()) <= 6
+    deduplicator.close()
+
+    reopened = RowDeduplicator(store, expected_rows=100000)
+    ids, duplicates = load(reopened, write_csv(tmp_path / 'all.csv', range(0, 16500, 10)), 'all')
+    assert ids == [str(i) for i in range(16000, 16500, 10)]
+    assert duplicates == 1600
+    reopened.close()
+
+
+def test_filter_records(tmp_path):
+    deduplicator = RowDeduplicator(str(tmp_path / 'dedup'), expected_rows=10000)
+    records = [{'id': 1, 'value': 'a'}, {'id': 2, 'value': 'b'}, {'id': 1, 'value': 'c'}]
+    assert deduplicator.filter_records(records, ['id'], 'first') == (records[:2], 1)
+    deduplicator.commit()
+    deduplicator.release('first')
+    assert deduplicator.filter_records(records + [{'id': 3, 'value': 'd'}], ['id'], 'second') == ([{'id': 3, 'value': 'd'}], 3)
+    assert deduplicator.filter_records(records + [records[0]], [], 'third') == (records, 1)
+    deduplicator.close()
+
+
+def test_resume_after_an_overlapping_file_loads_every_row_once(tmp_path, make_etl):
+    make, target = make_etl
+    first = write_csv(tmp_path / 'a.csv', range(1000))
+    overlapping = write_csv(tmp_path / 'b.csv', list(range(100)) + list(range(450, 500)) + [5000])
+
+    etl = make()
+    etl.dedup_rows = True
+    target.fail_after_batches = 4
+    with pytest.raises(RuntimeError):
+        etl.handle_csv(first, 'Loads')
+    target.fail_after_batches = None
+    etl.handle_csv(overlapping, 'Loads')
+    etl.checkpoints.complete(overlapping, 'Loads')
+    assert etl.run_report[-1]['duplicates_dropped'] == 100
+
+    resumed = make()
+    resumed.dedup_rows = True
+    resumed.handle_csv(first, 'Loads')
+    assert sorted(target.rows('Loads'), key=int) == [str(i) for i in list(range(1000)) + [5000]]
+    assert resumed.run_report[-1]['duplicates_dropped'] == 50
+    assert 'Dropped 50 duplicate rows' in resumed.run_report_summary()
+
+
+def test_dropping_the_table_wipes_the_store(tmp_path, make_etl):
+    make, target = make_etl
+    source = write_csv(tmp_path / 'a.csv', range(100))
+
+    etl = make()
+    etl.dedup_rows = True
+    etl.handle_csv(source, 'Loads')
+    store = os.path.join(str(tmp_path / 'logs'), 'dedup', 'Loads')
+    assert glob.glob(os.path.join(store, 'keys_*.bin'))
+
+    etl.reset_deduplicator('Loads')
+    assert not os.path.exists(store)
+    etl.get_deduplicator('Loads')
+    assert load(etl.get_deduplicator('Loads'), source, 'again')[1] == 0